@@ -7,25 +7,42 @@
 
 Требования и предупреждения:
 - Рабочее дерево должно быть чистым.
-- История переписывается (git filter-branch). После завершения для удалённой ветки
-  потребуется force-push: git push --force-with-lease.
+- История переписывается. Если это HEAD — через `git commit --amend`, иначе через
+  `git filter-branch`, но только для коммитов начиная с указанного (более старая
+  история не трогается). После завершения для удалённой ветки потребуется
+  force-push: git push --force-with-lease.
+- Даты автора и коммиттера сохраняются.
+- Теги, указывающие на переписанные коммиты, переносятся на новые.
 - Скрипт трогает только указанный коммит; остальные сообщения остаются без изменений.
 """
 
 from __future__ import annotations
 
+import argparse
 import os
 import subprocess
 import sys
-from typing import Sequence
+from typing import Optional, Sequence, Tuple
 
 
-def run_git(args: Sequence[str], check: bool = True) -> subprocess.CompletedProcess[str]:
+def run_git(args: Sequence[str], check: bool = True, input: Optional[str] = None) -> subprocess.CompletedProcess[str]:
     return subprocess.run(
         ["git", *args],
         text=True,
         capture_output=True,
         check=check,
+        input=input,
+    )
+
+
+def run_git_silent(args: Sequence[str], check: bool = True) -> subprocess.CompletedProcess[str]:
+    """Как run_git, но stdout не перехватывается в pipe (вывод не нужен), stderr — для ошибок."""
+    return subprocess.run(
+        ["git", *args],
+        text=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=check,
     )
 
 
@@ -35,14 +52,116 @@ def ensure_clean_worktree() -> None:
         sys.exit("Рабочее дерево грязное. Очистите или закоммитьте изменения перед переписыванием истории.")
 
 
-def validate_commit_exists(commit: str) -> None:
-    try:
-        run_git(["cat-file", "-t", commit], check=True)
-    except subprocess.CalledProcessError:
+class GitCatFile:
+    """
+    Долгоживущий процесс `git cat-file --batch-check` для поиска объектов.
+
+    Один процесс обслуживает любое количество запросов через stdin/stdout,
+    вместо отдельного `git cat-file -t` на каждую проверку.
+    """
+
+    def __init__(self) -> None:
+        self.proc: Optional[subprocess.Popen[str]] = None
+
+    def __enter__(self) -> "GitCatFile":
+        self.proc = subprocess.Popen(
+            ["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self.proc is None:
+            return
+        if self.proc.stdin:
+            self.proc.stdin.close()
+        self.proc.wait()
+        if self.proc.stdout:
+            self.proc.stdout.close()
+        self.proc = None
+
+    def lookup(self, rev: str) -> Optional[Tuple[str, str]]:
+        """Возвращает (полный хэш, тип объекта) или None, если объект не найден."""
+        assert self.proc is not None and self.proc.stdin and self.proc.stdout
+        self.proc.stdin.write(rev + "\n")
+        self.proc.stdin.flush()
+        line = self.proc.stdout.readline().rstrip("\n")
+        # Для ненайденных объектов git отвечает "<rev> missing" (или "<rev> ambiguous")
+        if not line or line.endswith((" missing", " ambiguous")):
+            return None
+        object_name, object_type = line.split(" ", 1)
+        return object_name, object_type
+
+
+def validate_commit_exists(commit: str, cat_file: GitCatFile) -> str:
+    """Проверяет, что коммит существует, и возвращает его полный хэш."""
+    # ^{commit} разыменовывает аннотированные теги до коммита, на который они указывают
+    found = cat_file.lookup(f"{commit}^{{commit}}")
+    if found is None or found[1] != "commit":
         sys.exit(f"Коммит '{commit}' не найден.")
+    return found[0]
+
+
+def move_tags(old: str, new: str) -> None:
+    """
+    Переносит теги со старого коммита на переписанный, как `--tag-name-filter cat`
+    у filter-branch: легкие теги просто перенаправляются, аннотированные создаются
+    заново с тем же текстом (подпись, как и у filter-branch, отбрасывается).
+    Все ссылки обновляются одной транзакцией `git update-ref --stdin`.
+    """
+    refs = run_git(
+        ["for-each-ref", "--points-at", old, "--format=%(refname) %(objecttype) %(objectname)", "refs/tags"]
+    ).stdout.splitlines()
+    if not refs:
+        return
+
+    updates = []
+    for line in refs:
+        refname, objtype, objectname = line.split()
+        if objtype == "tag":
+            raw = run_git(["cat-file", "tag", objectname]).stdout
+            header, sep, body = raw.partition("\n\n")
+            header = header.replace(f"object {old}", f"object {new}", 1)
+            for marker in ("-----BEGIN PGP SIGNATURE-----", "-----BEGIN SSH SIGNATURE-----"):
+                body = body.split(marker, 1)[0]
+            target = run_git(["mktag"], input=header + sep + body).stdout.strip()
+        else:
+            target = new
+        updates.append(f"update {refname} {target} {objectname}\n")
+
+    try:
+        run_git(["update-ref", "-m", "change_commit_message: move tag", "--stdin"], input="".join(updates))
+    except subprocess.CalledProcessError as exc:
+        sys.exit(f"Сообщение изменено, но теги перенести не удалось: {exc.stderr.strip()}")
+    print("Перенесены теги: " + ", ".join(line.split()[0][len("refs/tags/"):] for line in refs))
+
+
+def amend_head(new_message: str) -> None:
+    """Меняет сообщение HEAD через --amend, сохраняя дату коммиттера и теги."""
+    old_head = run_git(["rev-parse", "HEAD"]).stdout.strip()
+    env = os.environ.copy()
+    env["GIT_COMMITTER_DATE"] = run_git(["log", "-1", "--format=%cI", "HEAD"]).stdout.strip()
+    cmd = ["git", "commit", "--amend", "--only", "--no-verify", "--allow-empty", "-m", new_message]
+    try:
+        subprocess.run(cmd, text=True, check=True, env=env)
+    except subprocess.CalledProcessError as exc:
+        sys.exit(f"git commit --amend завершился с ошибкой: {exc}")
+    move_tags(old_head, run_git(["rev-parse", "HEAD"]).stdout.strip())
 
 
 def rewrite(commit: str, new_message: str) -> None:
+    if run_git(["merge-base", "--is-ancestor", commit, "HEAD"], check=False).returncode != 0:
+        sys.exit(f"Коммит {commit} не входит в историю текущей ветки.")
+
+    print(f"Переписываю сообщение для коммита {commit} ...")
+    descendants = int(run_git(["rev-list", "--count", f"{commit}..HEAD"]).stdout.strip())
+    if descendants == 0:
+        amend_head(new_message)
+        print("Готово. Не забудьте сделать force-push, если требуется.")
+        return
+
     env = os.environ.copy()
     env["TARGET_COMMIT"] = commit
     env["TARGET_MESSAGE"] = new_message
@@ -57,6 +176,9 @@ else
 fi
 """
 
+    # Исключаем родителей целевого коммита: переписываются только он и его потомки,
+    # а не вся история до корня (у корневого коммита родителей нет — берем всю ветку).
+    parents = run_git(["rev-parse", f"{commit}^@"]).stdout.split()
     cmd = [
         "git",
         "filter-branch",
@@ -67,9 +189,9 @@ fi
         "cat",
         "--",
         "HEAD",
+        *(f"^{parent}" for parent in parents),
     ]
 
-    print(f"Переписываю сообщение для коммита {commit} ...")
     try:
         subprocess.run(cmd, text=True, check=True, env=env)
     except subprocess.CalledProcessError as exc:
@@ -77,18 +199,24 @@ fi
     print("Готово. Не забудьте сделать force-push, если требуется.")
 
 
-def main() -> None:
-    if len(sys.argv) < 3:
-        sys.exit("Использование: python3 change_commit_message.py <commit_hash> \"<new message>\"")
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Изменить сообщение заданного коммита, переписав историю ветки.")
+    parser.add_argument("commit", help="Хэш коммита (можно сокращенный) или другая ссылка на него")
+    parser.add_argument("message", help="Новое сообщение коммита (в кавычках, если из нескольких слов)")
+    return parser.parse_args()
+
 
-    commit = sys.argv[1].strip()
-    new_message = " ".join(sys.argv[2:]).strip()
+def main() -> None:
+    args = parse_args()
+    commit = args.commit.strip()
+    new_message = args.message.strip()
 
     if not new_message:
         sys.exit("Новое сообщение пустое.")
 
     ensure_clean_worktree()
-    validate_commit_exists(commit)
+    with GitCatFile() as cat_file:
+        commit = validate_commit_exists(commit, cat_file)
     rewrite(commit, new_message)
 
     # Опциональный push
@@ -96,10 +224,10 @@ def main() -> None:
     if answer in {"y", "yes"}:
         print("Выполняю push...")
         try:
-            run_git(["push", "--force-with-lease"], check=True)
+            run_git_silent(["push", "--force-with-lease"], check=True)
             print("Push выполнен.")
         except subprocess.CalledProcessError as exc:
-            sys.exit(f"Push не удался: {exc.stderr or exc.stdout}")
+            sys.exit(f"Push не удался: {exc.stderr}")
     else:
         print("Push пропущен. При необходимости выполните вручную: git push --force-with-lease")
 
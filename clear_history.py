@@ -2,21 +2,49 @@
 """
 Скрипт для полной очистки истории коммитов в Git репозитории.
 Удаляет все коммиты, но сохраняет файлы в рабочей директории.
+
+Старая .git директория мгновенно переименовывается, а физически удаляется
+в фоне — на больших репозиториях это занимает основное время.
 """
 
 import os
 import subprocess
 import shutil
+import threading
 from pathlib import Path
 
+
+def remove_in_background(path):
+    """Удаляет директорию в фоне, не задерживая пользователя"""
+    if hasattr(os, 'fork'):
+        pid = os.fork()
+        if pid == 0:
+            # Дочерний процесс: удаляем и выходим через _exit, минуя буферы и обработчики родителя
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                os._exit(0)
+        return
+
+    # Windows: fork недоступен — обычный (не daemon) поток, интерпретатор дождется его перед выходом
+    threading.Thread(target=shutil.rmtree, args=(path,), kwargs={'ignore_errors': True}).start()
+
 def clear_git_history():
     """Очищает всю историю коммитов Git"""
     repo_path = os.getcwd()
-    git_dir = os.path.join(repo_path, '.git')
     
-    if not os.path.exists(git_dir):
+    # git сам находит git-dir с учетом $GIT_DIR, gitlink-файлов подмодулей и worktree
+    result = subprocess.run(['git', 'rev-parse', '--git-dir'], capture_output=True, text=True, cwd=repo_path)
+    if result.returncode != 0:
         print("❌ Git репозиторий не найден в текущей директории")
         return False
+    git_dir = os.path.normpath(os.path.join(repo_path, result.stdout.strip()))
+    
+    # Удаляем только собственную .git директорию: у worktree и подмодуля git-dir лежит
+    # внутри другого репозитория, а из подкаталога нашелся бы .git родителя
+    if git_dir != os.path.join(repo_path, '.git') or not os.path.isdir(git_dir):
+        print(f"❌ Текущая директория не корень обычного Git репозитория (git-dir: {git_dir})")
+        return False
     
     print("⚠️  ВНИМАНИЕ: Это удалит всю историю коммитов!")
     print(f"Директория: {repo_path}")
@@ -28,16 +56,24 @@ def clear_git_history():
         return False
     
     try:
-        # Удаляем .git директорию
-        print("\nУдаление .git директории...")
-        shutil.rmtree(git_dir)
-        print("✓ .git директория удалена")
+        # Переименование атомарно и мгновенно, в отличие от удаления всех объектов
+        print("\nОтключение старой .git директории...")
+        trash_name = f'.git.trash-{os.getpid()}'
+        trash_dir = os.path.join(repo_path, trash_name)
+        os.rename(git_dir, trash_dir)
+        print("✓ .git директория отключена")
         
         # Инициализируем новый репозиторий
         print("\nИнициализация нового Git репозитория...")
         subprocess.run(['git', 'init'], check=True, capture_output=True)
         print("✓ Новый репозиторий инициализирован")
         
+        # Прячем старую историю внутрь нового .git (там ее не увидят git status/add) и удаляем в фоне
+        graveyard = os.path.join(git_dir, trash_name)
+        os.rename(trash_dir, graveyard)
+        remove_in_background(graveyard)
+        print("✓ Старая история удаляется в фоне")
+        
         # Показываем статус
         result = subprocess.run(['git', 'status'], capture_output=True, text=True)
         print("\nТекущий статус:")
@@ -9,7 +9,11 @@
 - Собирает список незакоммиченных файлов (отслеживаемые изменения + новые файлы).
 - Если дат больше либо равно числу файлов — ставит по одному коммиту на дату.
 - Если дат меньше, чем файлов — равномерно распределяет файлы по доступным датам (несколько коммитов на дату),
-  проставляя GIT_AUTHOR_DATE и GIT_COMMITTER_DATE на выбранную дату (время фиксируем на 12:00:00).
+  проставляя дату автора и коммиттера на выбранную дату (время фиксируем на 12:00:00).
+- Содержимое файлов заранее записывается в базу объектов параллельно несколькими процессами
+  `git hash-object -w --stdin-paths` (не больше 3/4 числа ядер).
+- Все коммиты пишутся одним потоком в `git fast-import` (один процесс git на весь план
+  вместо пары `git add` + `git commit` на каждый файл), после чего индекс синхронизируется с новым HEAD.
 
 Использование:
   python commit_by_date.py
@@ -22,16 +26,35 @@
 
 Ограничения:
 - Скрипт не меняет содержимое файлов — только коммитит текущие незакоммиченные изменения.
+- HEAD должен указывать на ветку (в состоянии detached HEAD скрипт не работает).
+- Новые файлы внутри неотслеживаемых директорий коммитятся по одному (`--untracked-files=all`).
+- Подмодули и вложенные репозитории коммитятся ссылкой на их текущий коммит, как при `git add`.
 """
 
 from __future__ import annotations
 
 import argparse
 import os
+import shutil
+import stat
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, time, timedelta
-from typing import List, Optional, Sequence, Tuple
+from itertools import chain, repeat
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+# Полный путь к git находим один раз: иначе каждый запуск заново перебирает каталоги PATH
+GIT = shutil.which("git") or "git"
+# Временные ссылки, в которые fast-import пишет цепочку коммитов до переноса ветки
+SCRATCH_REF_PREFIX = "refs/commit-by-date"
+# Размер блока при потоковом чтении вывода git status
+STATUS_CHUNK_SIZE = 64 * 1024
+# Ограничение параллельных процессов git: 3/4 ядер, чтобы не упереться в лимиты процессов/FD
+HASH_WORKERS = max(1, (os.cpu_count() or 1) * 3 // 4)
+# Меньше файлов на процесс не имеет смысла — запуск git дороже хеширования
+MIN_PATHS_PER_WORKER = 32
 
 
 def run_git(
@@ -39,15 +62,40 @@ def run_git(
     check: bool = True,
     env: Optional[dict] = None,
     cwd: Optional[str] = None,
-) -> subprocess.CompletedProcess[str]:
-    """Запускает git-команду и возвращает результат (кроссплатформенно)."""
+    input: Optional[Union[str, bytes]] = None,
+    binary: bool = False,
+) -> subprocess.CompletedProcess[Any]:
+    """
+    Запускает git-команду и возвращает результат (кроссплатформенно).
+
+    При binary=True stdin/stdout/stderr передаются как bytes без декодирования.
+    """
     return subprocess.run(
-        ["git", *args],
-        text=True,
+        [GIT, *args],
+        text=not binary,
         capture_output=True,
         check=check,
         env=env,
         cwd=cwd,  # Работает на Windows и Unix
+        input=input,
+    )
+
+
+def run_git_silent(
+    args: Sequence[str],
+    check: bool = True,
+    env: Optional[dict] = None,
+    cwd: Optional[str] = None,
+) -> subprocess.CompletedProcess[str]:
+    """Запускает git-команду, вывод которой не нужен: stdout отбрасывается, stderr — для ошибок."""
+    return subprocess.run(
+        [GIT, *args],
+        text=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=check,
+        env=env,
+        cwd=cwd,
     )
 
 
@@ -75,7 +123,7 @@ def resolve_repo_path(repo_arg: Optional[str]) -> Optional[str]:
     # Проверяем, что это git-репозиторий
     try:
         result = subprocess.run(
-            ["git", "rev-parse", "--show-toplevel"],
+            [GIT, "rev-parse", "--show-toplevel"],
             cwd=repo_path,  # cwd работает на всех платформах
             text=True,
             capture_output=True,
@@ -104,57 +152,127 @@ def ensure_repo_root(repo_path: Optional[str] = None) -> str:
         sys.exit(f"Ошибка: не удалось определить корень репозитория ({exc.stderr.strip()})")
 
 
-def ensure_clean_index(repo_path: Optional[str] = None) -> None:
-    """Проверяет, что индекс пуст (нет подготовленных файлов)."""
-    result = run_git(["diff", "--cached", "--name-only"], cwd=repo_path)
-    staged = [line for line in result.stdout.splitlines() if line.strip()]
-    if staged:
-        sys.exit(
-            "В индексе уже есть подготовленные файлы. Очистите его перед запуском скрипта, "
-            "чтобы случайно не закоммитить лишнее."
-        )
-
-
-def parse_uncommitted_files(repo_path: Optional[str] = None) -> List[str]:
+def iter_status_records(repo_path: Optional[str] = None) -> Iterator[bytes]:
     """
-    Возвращает список незакоммиченных файлов (отслеживаемые изменения и новые файлы).
+    Выдает записи `git status --porcelain=v2 -z` по мере их поступления.
 
-    Используем `git status --porcelain -z`, чтобы корректно обрабатывать пробелы в путях
-    и переименования (берем новую сторону для R/C).
+    Вывод читается блоками по 64 КиБ и режется по NUL, поэтому в памяти держится
+    только текущий блок, а не весь вывод git status целиком.
+    """
+    # stderr пишется во временный файл: второй канал, который никто не читает, пока
+    # читается stdout, при большом числе предупреждений заблокировал бы git status.
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(
+            [GIT, "status", "--porcelain=v2", "-z", "--untracked-files=all"],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            cwd=repo_path,
+        )
+        assert proc.stdout is not None
+
+        tail = b""
+        with proc.stdout:
+            while True:
+                chunk = proc.stdout.read1(STATUS_CHUNK_SIZE)
+                if not chunk:
+                    break
+                # Последний кусок может оборваться посреди записи — он ждет следующего блока
+                *complete, tail = (tail + chunk).split(b"\0")
+                yield from complete
+        if tail:
+            yield tail
+
+        if proc.wait() != 0:
+            stderr.seek(0)
+            sys.exit(f"Не удалось получить статус репозитория: {os.fsdecode(stderr.read()).strip()}")
+
+
+def scan_worktree(
+    repo_path: Optional[str] = None,
+) -> Tuple[List[str], List[Tuple[str, str, Optional[str]]], List[str]]:
     """
-    result = run_git(["status", "--porcelain=v1", "-z"], cwd=repo_path)
-    entries = result.stdout.split("\0")
-
-    files: List[str] = []
-    i = 0
-    while i < len(entries):
-        entry = entries[i]
-        if not entry:
-            i += 1
+    Одним вызовом `git status` возвращает подготовленные в индексе пути, список
+    незакоммиченных файлов (отслеживаемые изменения и новые файлы) в виде троек
+    (статус XY из porcelain, путь, режим в рабочем дереве) и пути подмодулей,
+    коммитить которые нечего.
+
+    Используем `git status --porcelain=v2 -z`: пробелы в путях и переименования
+    (запись типа "2" с исходным путем в следующем поле) разбираются однозначно.
+    Вывод читаем потоком как bytes (iter_status_records) и декодируем только
+    пути (как имена файлов ОС). Статус сохраняем, чтобы удаленные файлы можно
+    было закоммитить без обращения к файловой системе.
+
+    Режим для отслеживаемых файлов берется из поля mW: git уже учел в нем
+    core.fileMode (и core.symlinks), как при `git add`. Для новых файлов режим
+    None — его определяет файловая система. Вложенный репозиторий git показывает
+    как каталог со слешем на конце, ему, как и подмодулю, ставится режим 160000.
+    """
+    records = iter_status_records(repo_path)
+
+    staged: List[str] = []
+    files: Dict[str, Tuple[str, Optional[str]]] = {}
+    skipped: List[str] = []
+    for record in records:
+        kind = record[:1]
+
+        if kind == b"1":
+            # 1 XY sub mH mI mW hH hI path
+            fields = record.split(b" ", 8)
+            status, sub, mode, path = fields[1], fields[2], fields[5].decode("ascii"), fields[8]
+        elif kind == b"2":
+            # 2 XY sub mH mI mW hH hI Xscore path, затем исходный путь отдельной записью
+            fields = record.split(b" ", 9)
+            status, sub, mode, path = fields[1], fields[2], fields[5].decode("ascii"), fields[9]
+            next(records, None)
+        elif kind == b"u":
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path — конфликт слияния, индекс не чист
+            fields = record.split(b" ", 10)
+            staged.append(os.fsdecode(fields[10]))
+            continue
+        elif kind == b"?":
+            status, sub, path = b"??", b"N...", record[2:]
+            mode = "160000" if path.endswith(b"/") else None
+            path = path.rstrip(b"/")
+        else:
+            # Пустые записи, игнорируемые файлы ("!") и заголовки ("#")
             continue
 
-        status = entry[:2]
-        path = entry[3:]  # пропускаем два символа статуса и пробел
-
-        # Для переименования/копирования Git кладет новый путь в следующую запись
-        if status.startswith("R") or status.startswith("C"):
-            if i + 1 < len(entries) and entries[i + 1]:
-                path = entries[i + 1]
-                i += 1  # пропускаем дополнительный путь
-
-        # Игнорируем записи про игнорируемые файлы/директории
-        if status.startswith("!"):
-            i += 1
+        if not path:
+            continue
+        # X — состояние в индексе ("." — без изменений), Y — в рабочем дереве
+        if status[:1] not in (b".", b"?"):
+            staged.append(os.fsdecode(path))
+        if status[1:2] == b".":
+            continue
+        if sub[:1] == b"S" and sub[1:2] != b"C" and status[1:2] != b"D":
+            # В подмодуле изменены только файлы, а не коммит — как и для `git add`,
+            # в суперпроекте коммитить нечего
+            skipped.append(os.fsdecode(path))
             continue
+        files[os.fsdecode(path)] = (status.decode("ascii"), mode)
 
-        cleaned = path.strip()
-        if cleaned:
-            files.append(cleaned)
+    # Сортируем по пути для предсказуемости
+    entries = [(files[path][0], path, files[path][1]) for path in sorted(files)]
+    return staged, entries, skipped
 
-        i += 1
 
-    # Убираем дубликаты и сортируем для предсказуемости
-    return sorted(set(files))
+def resolve_gitlinks(paths: Sequence[str], repo_path: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Для подмодулей и вложенных репозиториев возвращает коммит, который записал бы
+    `git add` (HEAD вложенного репозитория), и список путей, где его нет.
+    """
+    gitlinks: Dict[str, str] = {}
+    unresolved: List[str] = []
+    for path in paths:
+        result = run_git(
+            ["rev-parse", "-q", "--verify", "HEAD"], check=False, cwd=os.path.join(repo_path, path)
+        )
+        sha = result.stdout.strip()
+        if result.returncode == 0 and sha:
+            gitlinks[path] = sha
+        else:
+            unresolved.append(path)
+    return gitlinks, unresolved
 
 
 def read_date(prompt: str) -> date:
@@ -188,20 +306,12 @@ def build_plan(files: Sequence[str], dates: Sequence[date]) -> List[Tuple[str, d
     if len(dates) >= len(files):
         return list(zip(files, dates[: len(files)]))
 
-    total_files = len(files)
     total_dates = len(dates)
-    base = total_files // total_dates
-    extra = total_files % total_dates  # первые `extra` дат получат на 1 файл больше
+    base, extra = divmod(len(files), total_dates)  # первые `extra` дат получат на 1 файл больше
 
-    plan: List[Tuple[str, date]] = []
-    idx = 0
-    for i, commit_date in enumerate(dates):
-        quota = base + (1 if i < extra else 0)
-        for _ in range(quota):
-            plan.append((files[idx], commit_date))
-            idx += 1
-
-    return plan
+    # Каждая дата повторяется quota раз подряд; repeat/chain разворачивают это без цикла на Python
+    quotas = [base + 1] * extra + [base] * (total_dates - extra)
+    return list(zip(files, chain.from_iterable(map(repeat, dates, quotas))))
 
 
 def confirm_plan(pairs: Sequence[Tuple[str, date]]) -> None:
@@ -214,26 +324,285 @@ def confirm_plan(pairs: Sequence[Tuple[str, date]]) -> None:
         sys.exit("Операция отменена пользователем.")
 
 
-def commit_file_on_date(file_path: str, commit_date: date, repo_path: Optional[str] = None) -> None:
-    """Делает коммит указанного файла с фиктивной датой."""
-    commit_dt = datetime.combine(commit_date, time(hour=12, minute=0, second=0))
-    date_str = commit_dt.strftime("%Y-%m-%d %H:%M:%S")
+def get_current_branch(repo_path: Optional[str] = None) -> Tuple[str, bool]:
+    """Возвращает полное имя текущей ветки (refs/heads/...) и признак, есть ли в ней коммиты."""
+    # Обычный случай — один вызов git: полное имя ветки, на которую указывает HEAD
+    result = run_git(
+        ["rev-parse", "-q", "--verify", "--symbolic-full-name", "HEAD"], check=False, cwd=repo_path
+    )
+    branch = result.stdout.strip()
+    if result.returncode == 0:
+        if not branch.startswith("refs/"):
+            sys.exit("HEAD не указывает на ветку (detached HEAD). Переключитесь на ветку и повторите.")
+        return branch, True
+
+    # В ветке еще нет коммитов: rev-parse не находит HEAD, имя берем из symbolic-ref
+    result = run_git(["symbolic-ref", "-q", "HEAD"], check=False, cwd=repo_path)
+    branch = result.stdout.strip()
+    if result.returncode != 0 or not branch:
+        sys.exit("HEAD не указывает на ветку (detached HEAD). Переключитесь на ветку и повторите.")
+    return branch, False
+
+
+def get_ident(var: str, repo_path: Optional[str] = None) -> str:
+    """Возвращает 'Name <email>' из `git var GIT_AUTHOR_IDENT`/`GIT_COMMITTER_IDENT` (без даты)."""
+    try:
+        ident = run_git(["var", var], cwd=repo_path).stdout.strip()
+    except subprocess.CalledProcessError as exc:
+        sys.exit(f"Не удалось определить автора коммитов: {exc.stderr.strip()}")
+    # Формат: "Name <email> 1700000000 +0300" — отбрасываем timestamp и часовой пояс
+    return ident.rsplit(" ", 2)[0]
+
+
+def format_raw_date(commit_date: date) -> str:
+    """Дата в формате raw для fast-import: '<unix-time> <tz>' (12:00 по локальному времени)."""
+    commit_dt = datetime.combine(commit_date, time(hour=12, minute=0, second=0)).astimezone()
+    return f"{int(commit_dt.timestamp())} {commit_dt.strftime('%z')}"
+
+
+def quote_path(path: str) -> str:
+    """Экранирует путь для fast-import (кавычки обязательны, если путь начинается с '"' или содержит LF)."""
+    if path.startswith('"') or "\n" in path:
+        escaped = path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return f'"{escaped}"'
+    return path
+
+
+def stdin_path_safe(path: str) -> bool:
+    """Можно ли передать путь в `git hash-object --stdin-paths` как есть, строкой без кавычек."""
+    return "\n" not in path and not path.startswith('"') and not path.endswith("\r")
+
+
+def worktree_mode(full_path: str) -> str:
+    """Режим нового (неотслеживаемого) файла для git по данным файловой системы."""
+    st = os.lstat(full_path)
+    if stat.S_ISLNK(st.st_mode):
+        return "120000"
+    return "100755" if st.st_mode & stat.S_IXUSR else "100644"
 
+
+def read_blob(full_path: str, mode: str) -> bytes:
+    """Содержимое файла для blob (для симлинка — путь, на который он указывает)."""
+    # При core.symlinks=false симлинк лежит обычным файлом с путем внутри
+    if mode == "120000" and os.path.islink(full_path):
+        return os.fsencode(os.readlink(full_path))
+    with open(full_path, "rb") as f:
+        return f.read()
+
+
+def bulk_write_env() -> Dict[str, str]:
+    """
+    Окружение для массовой записи коммитов: отключает fsync (core.fsync=none).
+
+    История фиктивная, поэтому сотни fsync на объекты/ссылки/индекс не нужны.
+    Параметр добавляется через GIT_CONFIG_COUNT/KEY/VALUE поверх уже заданных
+    пользователем; старые версии git (< 2.36) его просто игнорируют.
+    """
     env = os.environ.copy()
-    env["GIT_AUTHOR_DATE"] = date_str
-    env["GIT_COMMITTER_DATE"] = date_str
+    count = int(env.get("GIT_CONFIG_COUNT") or 0)
+    env[f"GIT_CONFIG_KEY_{count}"] = "core.fsync"
+    env[f"GIT_CONFIG_VALUE_{count}"] = "none"
+    env["GIT_CONFIG_COUNT"] = str(count + 1)
+    return env
+
+
+def hash_files(paths: Sequence[str], repo_path: str, env: Optional[dict] = None) -> Dict[str, str]:
+    """
+    Записывает файлы в базу объектов и возвращает сопоставление путь -> хэш blob.
+
+    Пути делятся между несколькими процессами `git hash-object -w --stdin-paths`,
+    которые работают параллельно (хеширование и сжатие — работа самого git).
+    Фильтры (.gitattributes, autocrlf) применяются так же, как при `git add`.
+    """
+    if not paths:
+        return {}
+
+    workers = min(HASH_WORKERS, -(-len(paths) // MIN_PATHS_PER_WORKER))
+    chunks = [paths[i::workers] for i in range(workers)]
 
-    # Добавляем только нужный файл
-    run_git(["add", "--", file_path], cwd=repo_path)
+    def hash_chunk(chunk: Sequence[str]) -> List[Tuple[str, str]]:
+        stdin = b"".join(os.fsencode(path) + b"\n" for path in chunk)
+        result = run_git(["hash-object", "-w", "--stdin-paths"], env=env, cwd=repo_path, input=stdin, binary=True)
+        return list(zip(chunk, result.stdout.decode("ascii").split()))
 
-    # Формируем простое сообщение
-    message = f"Auto commit for {file_path}"
+    blobs: Dict[str, str] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for pairs in executor.map(hash_chunk, chunks):
+                blobs.update(pairs)
+    except subprocess.CalledProcessError as exc:
+        sys.exit(f"Не удалось записать файлы в базу объектов: {os.fsdecode(exc.stderr).strip()}")
+    return blobs
+
+
+def publish_commits(
+    branch: str,
+    scratch_ref: str,
+    count: int,
+    has_commits: bool,
+    repo_path: str,
+    env: Optional[dict] = None,
+) -> None:
+    """
+    Переводит ветку на созданную цепочку коммитов одной транзакцией `git update-ref --stdin`.
 
+    Ветка сдвигается только если она все еще указывает на родителя первого
+    нового коммита (иначе кто-то изменил ее во время работы скрипта), в reflog
+    пишется запись, временная ссылка удаляется в той же транзакции.
+    """
+    if has_commits:
+        # Родитель первого из count новых коммитов — прежнее значение ветки
+        move = f"update {branch} {scratch_ref} {scratch_ref}~{count}\n"
+    else:
+        move = f"create {branch} {scratch_ref}\n"
     try:
-        run_git(["commit", "-m", message], check=True, env=env, cwd=repo_path).check_returncode()
-        print(f"✓ {commit_date.isoformat()} — {file_path}")
+        run_git(
+            ["update-ref", "-m", f"commit_by_date: {count} commits", "--stdin"],
+            env=env,
+            cwd=repo_path,
+            input=move + f"delete {scratch_ref}\n",
+        )
     except subprocess.CalledProcessError as exc:
-        sys.exit(f"Не удалось сделать коммит для {file_path}: {exc.stderr or exc.stdout}")
+        sys.exit(
+            f"Коммиты созданы, но ветку {branch} обновить не удалось: {exc.stderr.strip()}\n"
+            f"Новые коммиты доступны по ссылке {scratch_ref}."
+        )
+
+
+def discard_import(proc: subprocess.Popen, scratch_ref: str, repo_path: str, env: Optional[dict] = None) -> None:
+    """Останавливает fast-import после сбоя и удаляет временную ссылку, если она успела появиться."""
+    if proc.poll() is None:
+        proc.kill()
+    try:
+        proc.stdin.close()
+    except OSError:
+        pass
+    proc.wait()
+    run_git(["update-ref", "-d", scratch_ref], check=False, env=env, cwd=repo_path)
+
+
+def run_fast_import(
+    plan: Sequence[Tuple[str, date]],
+    raw_dates: Dict[date, str],
+    deleted: Set[str],
+    worktree_modes: Dict[str, str],
+    gitlinks: Dict[str, str],
+    repo_path: str,
+) -> None:
+    """
+    Создает коммиты по плану одним потоком `git fast-import`.
+
+    Обычные файлы заранее записаны в базу объектов (hash_files) и ссылаются на
+    blob по хэшу; симлинки передаются прямо в потоке, подмодули и вложенные
+    репозитории — ссылкой на их коммит (режим 160000), удаленные (по статусу из
+    `git status`) — командой D. На каждый файл пишется коммит; первый коммит
+    продолжает текущую ветку, следующие — цепочку внутри потока.
+
+    fast-import пишет только объекты и временную ссылку, ветку переводит
+    publish_commits; затем индекс синхронизируется с новым HEAD (рабочее дерево
+    уже совпадает с ним).
+    """
+    branch, has_commits = get_current_branch(repo_path)
+    author = get_ident("GIT_AUTHOR_IDENT", repo_path)
+    committer = get_ident("GIT_COMMITTER_IDENT", repo_path)
+
+    # Режимы файлов: из git status для отслеживаемых (с учетом core.fileMode),
+    # по файловой системе — для новых. Обычные файлы хешируются заранее;
+    # пути, которые --stdin-paths прочитает иначе (LF внутри, '"' в начале — C-кавычки,
+    # CR в конце — обрезается), пойдут inline, как и симлинки.
+    modes: Dict[str, str] = {}
+    for file_path, _ in plan:
+        if file_path in deleted or file_path in gitlinks:
+            continue
+        mode = worktree_modes.get(file_path) or worktree_mode(os.path.join(repo_path, file_path))
+        modes[file_path] = mode
+    hashed = [path for path, mode in modes.items() if mode in ("100644", "100755") and stdin_path_safe(path)]
+    # Все команды записи ниже работают без fsync
+    env = bulk_write_env()
+    blobs = hash_files(hashed, repo_path, env)
+
+    proc = subprocess.Popen(
+        [GIT, "fast-import", "--date-format=raw", "--quiet", "--done"],
+        stdin=subprocess.PIPE,
+        env=env,
+        cwd=repo_path,
+    )
+    assert proc.stdin is not None
+
+    # Строки, общие для всех коммитов, собираем один раз; подпись автора/коммиттера —
+    # один раз на дату (после build_plan на одну дату обычно приходится несколько файлов)
+    scratch_ref = f"{SCRATCH_REF_PREFIX}/{os.getpid()}"
+    commit_line = f"commit {scratch_ref}\n".encode("utf-8")
+    signatures = {
+        commit_date: f"author {author} {raw_date}\ncommitter {committer} {raw_date}\n".encode("utf-8")
+        for commit_date, raw_date in raw_dates.items()
+    }
+
+    mark = 0
+    needs_from = has_commits
+    imported = False
+    try:
+        try:
+            for file_path, commit_date in plan:
+                full_path = os.path.join(repo_path, file_path)
+                path = os.fsencode(quote_path(file_path))
+
+                if file_path in blobs:
+                    change = f"M {modes[file_path]} {blobs[file_path]} ".encode() + path + b"\n"
+                elif file_path in deleted:
+                    # Файл удален из рабочего дерева — коммитим удаление
+                    change = b"D %s\n" % path
+                elif file_path in gitlinks:
+                    # Подмодуль/вложенный репозиторий — ссылка на его коммит, как делает git add
+                    change = f"M 160000 {gitlinks[file_path]} ".encode() + path + b"\n"
+                else:
+                    # Симлинки и пути с LF передаем inline
+                    mode = modes[file_path]
+                    content = read_blob(full_path, mode)
+                    mark += 1
+                    blob_mark = mark
+                    proc.stdin.write(b"blob\nmark :%d\ndata %d\n" % (blob_mark, len(content)))
+                    proc.stdin.write(content)
+                    proc.stdin.write(b"\n")
+                    change = b"M %s :%d %s\n" % (mode.encode(), blob_mark, path)
+
+                message = f"Auto commit for {file_path}".encode("utf-8", "surrogateescape")
+                mark += 1
+                proc.stdin.write(commit_line)
+                proc.stdin.write(b"mark :%d\n" % mark)
+                proc.stdin.write(signatures[commit_date])
+                proc.stdin.write(b"data %d\n%s\n" % (len(message), message))
+                if needs_from:
+                    # Только первый коммит потока явно продолжает текущее значение ветки,
+                    # дальше цепочка растет внутри потока сама
+                    proc.stdin.write(b"from " + branch.encode("utf-8") + b"^0\n")
+                    needs_from = False
+                proc.stdin.write(change)
+                proc.stdin.write(b"\n")
+                print(f"✓ {commit_date.isoformat()} — {file_path}")
+            # Без завершающей команды done fast-import не обновит ни одной ссылки,
+            # поэтому оборванный поток (ошибка, Ctrl+C) не оставит полуготовую цепочку
+            proc.stdin.write(b"done\n")
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        except OSError as exc:
+            sys.exit(f"Не удалось прочитать файл для коммита: {exc}")
+
+        if proc.wait() != 0:
+            sys.exit("git fast-import завершился с ошибкой, ветка не изменена.")
+        imported = True
+    finally:
+        if not imported:
+            discard_import(proc, scratch_ref, repo_path, env)
+
+    publish_commits(branch, scratch_ref, len(plan), has_commits, repo_path, env)
+
+    # Ветка обновлена, но не индекс — приводим индекс к новому HEAD
+    try:
+        run_git_silent(["reset", "-q"], env=env, cwd=repo_path)
+    except subprocess.CalledProcessError as exc:
+        sys.exit(f"Коммиты созданы, но не удалось обновить индекс: {exc.stderr.strip()}")
 
 
 def main() -> None:
@@ -252,21 +621,43 @@ def main() -> None:
     repo_path = resolve_repo_path(args.repo)
     repo_root = ensure_repo_root(repo_path)
     print(f"Корень репозитория: {repo_root}")
-    ensure_clean_index(repo_path)
+
+    # Один вызов git status и для проверки индекса, и для списка файлов
+    staged, entries, skipped = scan_worktree(repo_path)
+    if staged:
+        sys.exit(
+            "В индексе уже есть подготовленные файлы. Очистите его перед запуском скрипта, "
+            "чтобы случайно не закоммитить лишнее."
+        )
+
+    # Подмодули и вложенные репозитории коммитятся ссылкой на их HEAD; без коммитов
+    # в них ссылаться не на что — такие пути пропускаем
+    gitlinks, unresolved = resolve_gitlinks(
+        [path for status, path, mode in entries if mode == "160000" and "D" not in status], repo_root
+    )
+    skipped += unresolved
+    if skipped:
+        print("Пропущены подмодули и вложенные репозитории, для которых нечего коммитить:")
+        for path in sorted(skipped):
+            print(f"  - {path}")
+        entries = [entry for entry in entries if entry[1] not in unresolved]
+
+    if not entries:
+        sys.exit("Незакоммиченные файлы не найдены — делать нечего.")
 
     start = read_date("Стартовая дата (YYYY-MM-DD): ")
     end = read_date("Конечная дата (YYYY-MM-DD): ")
     dates = build_dates(start, end)
-
-    files = parse_uncommitted_files(repo_path)
-    if not files:
-        sys.exit("Незакоммиченные файлы не найдены — делать нечего.")
+    files = [path for _, path, _ in entries]
+    deleted = {path for status, path, _ in entries if "D" in status}
+    worktree_modes = {path: mode for _, path, mode in entries if mode and mode != "160000"}
 
     plan = build_plan(files, dates)
     confirm_plan(plan)
 
-    for file_path, commit_date in plan:
-        commit_file_on_date(file_path, commit_date, repo_path)
+    # Дата форматируется один раз на каждую уникальную дату плана, а не на каждый файл
+    raw_dates = {commit_date: format_raw_date(commit_date) for commit_date in {d for _, d in plan}}
+    run_fast_import(plan, raw_dates, deleted, worktree_modes, gitlinks, repo_root)
 
     print("\nГотово! Все файлы закоммичены с разными датами.")
 
@@ -14,6 +14,8 @@
 - Может предварительно проиндексировать конкретные файлы (--files) или всё сразу (-a/--all).
 - Если изменений в индексе нет и не указан --allow-empty, завершится без коммита.
 - Поддерживает параметр --repo для работы с указанным репозиторием (кроссплатформенно).
+- С флагом --pygit2 (нужен установленный pygit2) коммит делается через libgit2 без запуска
+  git; хуки и подпись коммитов при этом не выполняются. По умолчанию используется git CLI.
 """
 
 from __future__ import annotations
@@ -23,7 +25,16 @@ import os
 import subprocess
 import sys
 from datetime import datetime
-from typing import Iterable, Optional, Sequence
+from typing import Iterable, List, Optional, Sequence
+
+try:
+    import pygit2  # Необязательно: с --pygit2 коммит делается через libgit2 без запуска git
+except ImportError:
+    pygit2 = None
+
+# Скрипт не открывает своих файловых дескрипторов, которые нужно прятать от git,
+# поэтому на POSIX их не закрываем в дочернем процессе (быстрый путь запуска в subprocess).
+CLOSE_FDS = os.name != "posix"
 
 
 def run_git(
@@ -41,6 +52,27 @@ def run_git(
         check=check,
         env=env,
         cwd=cwd,  # Работает на Windows и Unix
+        close_fds=CLOSE_FDS,
+    )
+
+
+def run_git_silent(
+    args: Sequence[str],
+    *,
+    env: Optional[dict] = None,
+    check: bool = True,
+    cwd: Optional[str] = None,
+) -> subprocess.CompletedProcess[str]:
+    """Запускает git, когда вывод не нужен: stdout отбрасывается, stderr сохраняется для ошибок."""
+    return subprocess.run(
+        ["git", *args],
+        text=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=check,
+        env=env,
+        cwd=cwd,
+        close_fds=CLOSE_FDS,
     )
 
 
@@ -73,6 +105,7 @@ def resolve_repo_path(repo_arg: Optional[str]) -> Optional[str]:
             text=True,
             capture_output=True,
             check=True,
+            close_fds=CLOSE_FDS,
         )
         actual_repo_root = result.stdout.strip()
         # Нормализуем путь, возвращаемый Git (может содержать / на Windows)
@@ -108,17 +141,17 @@ def parse_commit_datetime(raw: str) -> datetime:
 def stage_files(files: Iterable[str], repo_path: Optional[str] = None) -> None:
     """Добавляет в индекс указанные файлы."""
     try:
-        run_git(["add", "--", *files], cwd=repo_path)
+        run_git_silent(["add", "--", *files], cwd=repo_path)
     except subprocess.CalledProcessError as exc:
-        sys.exit(f"Не удалось добавить файлы: {exc.stderr.strip() or exc.stdout.strip()}")
+        sys.exit(f"Не удалось добавить файлы: {exc.stderr.strip()}")
 
 
 def stage_all(repo_path: Optional[str] = None) -> None:
     """Добавляет все изменения (включая новые файлы)."""
     try:
-        run_git(["add", "-A"], cwd=repo_path)
+        run_git_silent(["add", "-A"], cwd=repo_path)
     except subprocess.CalledProcessError as exc:
-        sys.exit(f"Не удалось подготовить изменения: {exc.stderr.strip() or exc.stdout.strip()}")
+        sys.exit(f"Не удалось подготовить изменения: {exc.stderr.strip()}")
 
 
 def has_staged_changes(repo_path: Optional[str] = None) -> bool:
@@ -130,25 +163,97 @@ def has_staged_changes(repo_path: Optional[str] = None) -> bool:
 def commit_with_date(message: str, commit_dt: datetime, allow_empty: bool, repo_path: Optional[str] = None) -> None:
     """Делает коммит с указанной датой."""
     date_str = commit_dt.strftime("%Y-%m-%d %H:%M:%S")
-    env = os.environ.copy()
-    env["GIT_AUTHOR_DATE"] = date_str
-    env["GIT_COMMITTER_DATE"] = date_str
+    env = {**os.environ, "GIT_AUTHOR_DATE": date_str, "GIT_COMMITTER_DATE": date_str}
 
     cmd = ["commit", "-m", message]
     if allow_empty:
         cmd.append("--allow-empty")
 
-    try:
-        result = run_git(cmd, env=env, check=False, cwd=repo_path)
-    except subprocess.SubprocessError as exc:
-        sys.exit(f"Ошибка при выполнении git commit: {exc}")
-
+    result = run_git_silent(cmd, env=env, check=False, cwd=repo_path)
     if result.returncode != 0:
-        sys.exit(result.stderr.strip() or result.stdout.strip() or "git commit завершился с ошибкой")
+        sys.exit(result.stderr.strip() or "git commit завершился с ошибкой")
 
     print(f"Готово: коммит создан с датой {date_str}")
 
 
+def find_unmatched_paths(index: pygit2.Index, files: Sequence[str], paths: Sequence[str], repo_root: str) -> List[str]:
+    """Пути, которые не совпали ни с одним файлом (git add для них завершился бы ошибкой)."""
+    tracked = [entry.path for entry in index]
+    unmatched = []
+    for raw, path in zip(files, paths):
+        git_path = path.replace(os.sep, "/")
+        if git_path == ".." or git_path.startswith("../"):
+            unmatched.append(raw)
+        elif os.path.lexists(os.path.join(repo_root, path)):
+            continue
+        elif not any(p == git_path or p.startswith(git_path.rstrip("/") + "/") for p in tracked):
+            # Удаленный из рабочей копии, но отслеживаемый путь git add принимает
+            unmatched.append(raw)
+    return unmatched
+
+
+def make_signature(repo: pygit2.Repository, role: str, when: int, offset: int) -> pygit2.Signature:
+    """Подпись автора/коммиттера: как и git, сначала GIT_<ROLE>_NAME/EMAIL, затем user.* из конфига."""
+    name = os.environ.get(f"GIT_{role}_NAME")
+    email = os.environ.get(f"GIT_{role}_EMAIL")
+    if not name or not email:
+        default = repo.default_signature
+        name = name or default.name
+        email = email or default.email
+    return pygit2.Signature(name, email, when, offset)
+
+
+def commit_in_process(
+    repo_root: str,
+    message: str,
+    commit_dt: datetime,
+    files: Optional[Sequence[str]],
+    add_all: bool,
+    allow_empty: bool,
+    base_dir: str,
+) -> None:
+    """
+    Индексирует изменения и делает коммит через pygit2 (libgit2) внутри процесса.
+
+    Повторяет путь через git CLI: --files/--all (с ошибкой на несовпавший путь),
+    проверку пустого индекса, автора/коммиттера из GIT_*_NAME/EMAIL или конфига и дату
+    по локальному времени. Хуки и подпись коммитов libgit2 не выполняет.
+    """
+    try:
+        repo = pygit2.Repository(repo_root)
+        index = repo.index
+
+        if files:
+            # Пути из командной строки задаются относительно рабочей директории git
+            paths = [os.path.relpath(os.path.join(base_dir, f), repo_root) for f in files]
+            unmatched = find_unmatched_paths(index, files, paths, repo_root)
+            if unmatched:
+                sys.exit(f"Не удалось добавить файлы: pathspec '{unmatched[0]}' did not match any files")
+            index.add_all(paths)  # Как и git add, учитывает удаленные файлы
+        elif add_all:
+            index.add_all()
+        else:
+            print("Файлы не добавляются автоматически. Будут использованы уже подготовленные изменения.")
+        index.write()
+
+        tree = index.write_tree()
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        unchanged = tree == repo[parents[0]].tree_id if parents else len(index) == 0
+        if unchanged and not allow_empty:
+            sys.exit("В индексе нет изменений. Добавьте файлы или используйте --allow-empty.")
+
+        local_dt = commit_dt.astimezone()
+        offset = int(local_dt.utcoffset().total_seconds() // 60)
+        when = int(local_dt.timestamp())
+        author = make_signature(repo, "AUTHOR", when, offset)
+        committer = make_signature(repo, "COMMITTER", when, offset)
+        repo.create_commit("HEAD", author, committer, message.strip() + "\n", tree, parents)
+    except (pygit2.GitError, KeyError) as exc:
+        sys.exit(f"Ошибка при создании коммита через pygit2: {exc}")
+
+    print(f"Готово: коммит создан с датой {commit_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Сделать git-коммит с заданной датой.")
     parser.add_argument(
@@ -178,6 +283,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Разрешить пустой коммит, даже если изменений нет.",
     )
+    parser.add_argument(
+        "--pygit2",
+        action="store_true",
+        help="Сделать коммит через pygit2 (libgit2) без запуска git. Хуки и подпись коммитов не выполняются.",
+    )
     parser.add_argument(
         "--repo",
         type=str,
@@ -198,6 +308,23 @@ def main() -> None:
     if args.files and args.all:
         sys.exit("Нельзя использовать одновременно --files и --all.")
 
+    commit_dt = parse_commit_datetime(args.date)
+    message = args.message or f"Commit on {commit_dt.date()}"
+
+    if args.pygit2:
+        if pygit2 is None:
+            sys.exit("Для --pygit2 нужен установленный пакет pygit2 (pip install pygit2).")
+        commit_in_process(
+            repo_root,
+            message,
+            commit_dt,
+            files=args.files,
+            add_all=args.all,
+            allow_empty=args.allow_empty,
+            base_dir=repo_path or os.getcwd(),
+        )
+        return
+
     if args.files:
         stage_files(args.files, repo_path)
     elif args.all:
@@ -208,8 +335,6 @@ def main() -> None:
     if not has_staged_changes(repo_path) and not args.allow_empty:
         sys.exit("В индексе нет изменений. Добавьте файлы или используйте --allow-empty.")
 
-    commit_dt = parse_commit_datetime(args.date)
-    message = args.message or f"Commit on {commit_dt.date()}"
     commit_with_date(message, commit_dt, allow_empty=args.allow_empty, repo_path=repo_path)
 
 
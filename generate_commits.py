@@ -5,9 +5,13 @@
 """
 
 import os
+import queue
 import subprocess
 import random
+import sys
+import threading
 from datetime import datetime, timedelta
+from string import Formatter
 
 # Настройки
 START_DATE = datetime(2025, 1, 1)
@@ -105,39 +109,75 @@ FILE_TYPES = {
     }
 }
 
+def compile_template(template):
+    """Разбирает шаблон str.format один раз: [(текст, имя поля или None), ...]"""
+    return [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+
+
+# Шаблоны, разобранные заранее (без повторного разбора format-строки на каждый файл)
+COMPILED_TEMPLATES = {
+    name: [compile_template(template) for template in info['templates']]
+    for name, info in FILE_TYPES.items()
+}
+
+# Тип файла по расширению (вместо перебора FILE_TYPES для каждого коммита)
+EXT_TO_TYPE = {info['ext']: name for name, info in FILE_TYPES.items()}
+
 # Список файлов для работы
 FILES_TO_MANAGE = []
 
+# Содержимое файлов: путь -> текст (на диск пишется один раз после генерации)
+FILE_CONTENTS = {}
+
 
 def generate_file_content(file_type, name, desc):
     """Генерирует содержимое файла"""
     if file_type not in FILE_TYPES:
         file_type = 'text'
     
-    templates = FILE_TYPES[file_type]['templates']
-    template = random.choice(templates)
-    return template.format(name=name, desc=desc)
+    values = {'name': name, 'desc': desc}
+    parts = random.choice(COMPILED_TEMPLATES[file_type])
+    return ''.join(literal + values[field] if field else literal for literal, field in parts)
+
+
+def read_file(file_path):
+    """Возвращает текущее содержимое файла (при первом обращении читает его с диска)"""
+    if file_path not in FILE_CONTENTS:
+        try:
+            with open(file_path, encoding='utf-8', newline='') as f:
+                FILE_CONTENTS[file_path] = f.read()
+        except FileNotFoundError:
+            return None
+    return FILE_CONTENTS[file_path]
 
 
-def create_or_modify_file(file_path, file_type='text'):
-    """Создает или изменяет файл"""
+def create_or_modify_file(file_path, file_type, commit_dt):
+    """Создает или изменяет файл к коммиту commit_dt (в памяти, на диск он попадет в конце генерации)"""
     name = os.path.basename(file_path).replace(FILE_TYPES[file_type]['ext'], '')
     desc = random.choice(['Utility function', 'Helper class', 'Configuration', 'Documentation', 'Test file'])
     
-    if os.path.exists(file_path):
+    content = read_file(file_path)
+    if content is not None:
         # Модифицируем существующий файл
-        with open(file_path, 'a') as f:
-            f.write(f'\n# Updated: {datetime.now().isoformat()}\n')
+        FILE_CONTENTS[file_path] = content + f'\n# Updated: {commit_dt.isoformat()}\n'
     else:
         # Создаем новый файл
-        content = generate_file_content(file_type, name, desc)
-        os.makedirs(os.path.dirname(file_path) if os.path.dirname(file_path) else '.', exist_ok=True)
-        with open(file_path, 'w') as f:
-            f.write(content)
+        FILE_CONTENTS[file_path] = generate_file_content(file_type, name, desc)
     
     return file_path
 
 
+def write_files():
+    """Записывает итоговое содержимое файлов в рабочую копию"""
+    # Каталоги создаются один раз, а не перед записью каждого файла
+    for dir_name in {os.path.dirname(file_path) for file_path in FILE_CONTENTS} - {''}:
+        os.makedirs(dir_name, exist_ok=True)
+    
+    for file_path, content in FILE_CONTENTS.items():
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+
+
 def get_random_file():
     """Возвращает случайный файл для изменения"""
     if not FILES_TO_MANAGE:
@@ -161,55 +201,128 @@ def get_random_file():
         return file_path
 
 
-def make_commit(date, message):
-    """Создает коммит с указанной датой"""
-    # Форматируем дату для Git
-    date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Устанавливаем переменные окружения для даты
-    env = os.environ.copy()
-    env['GIT_AUTHOR_DATE'] = date_str
-    env['GIT_COMMITTER_DATE'] = date_str
-    
-    # Добавляем файлы
-    subprocess.run(['git', 'add', '-A'], check=True, capture_output=True)
-    
-    # Создаем коммит
-    result = subprocess.run(
-        ['git', 'commit', '-m', message],
-        env=env,
+def update_index(file_paths):
+    """Обновляет индекс только для сгенерированных файлов (вместо git reset по всему индексу)"""
+    subprocess.run(
+        ['git', 'update-index', '--add', '-z', '--stdin'],
+        input=''.join(f'{file_path}\0' for file_path in file_paths),
+        text=True,
         capture_output=True,
-        text=True
+        check=True,
     )
-    
-    if result.returncode != 0 and 'nothing to commit' not in result.stdout:
-        print(f"Warning: {result.stderr}")
-    elif result.returncode == 0:
-        print(f"✓ {date.strftime('%Y-%m-%d %H:%M')}: {message}")
 
 
-def should_skip_day(current_date, weekday_skip_days):
-    """Определяет, нужно ли пропустить день"""
-    weekday = current_date.weekday()  # 0=понедельник, 6=воскресенье
-    
-    # Выходные (суббота=5, воскресенье=6)
-    if weekday >= 5:
-        # Иногда пропускаем выходные
-        return random.random() < WEEKEND_SKIP_CHANCE
-    
-    # Рабочие дни (пн-пт)
-    # Проверяем, не является ли этот день одним из пропущенных в неделе
-    return current_date in weekday_skip_days
+def run_git(args):
+    """Запускает git и возвращает stdout"""
+    return subprocess.run(['git', *args], check=True, capture_output=True, text=True).stdout.strip()
 
 
-def get_commits_for_day(weekday):
-    """Возвращает количество коммитов для дня недели"""
-    # Выходные (суббота=5, воскресенье=6)
-    if weekday >= 5:
-        return random.randint(WEEKEND_COMMITS_MIN, WEEKEND_COMMITS_MAX)
-    # Рабочие дни (пн-пт)
-    else:
-        return random.randint(WEEKDAY_COMMITS_MIN, WEEKDAY_COMMITS_MAX)
+def get_current_branch():
+    """Возвращает ссылку текущей ветки и признак того, что в ней уже есть коммиты"""
+    result = subprocess.run(['git', 'symbolic-ref', '-q', 'HEAD'], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError('HEAD не указывает на ветку (detached HEAD), переключитесь на ветку')
+    branch = result.stdout.strip()
+    has_commits = subprocess.run(['git', 'rev-parse', '-q', '--verify', branch], capture_output=True).returncode == 0
+    return branch, has_commits
+
+
+def get_ident(var):
+    """Возвращает 'Name <email>' из git var (без даты)"""
+    return run_git(['var', var]).rsplit(' ', 2)[0]
+
+
+def format_date(date):
+    """Дата в формате raw для fast-import: '<unix-time> <tz>' по локальному времени"""
+    local = date.astimezone()
+    return f"{int(local.timestamp())} {local.strftime('%z')}"
+
+
+class CommitStream:
+    """Поток коммитов в один процесс `git fast-import` вместо git add/commit на каждый коммит.
+
+    Коммиты собираются в основном потоке, а в stdin fast-import их пишет отдельный
+    поток через ограниченную очередь: пока fast-import разбирает данные и пайп занят,
+    генерация следующих коммитов не останавливается."""
+
+    QUEUE_SIZE = 256
+
+    def __init__(self):
+        self.branch, has_commits = get_current_branch()
+        # Первый коммит продолжает текущую ветку, остальные — цепочку внутри потока
+        self.parent = f'{self.branch}^0' if has_commits else None
+        self.author = get_ident('GIT_AUTHOR_IDENT')
+        self.committer = get_ident('GIT_COMMITTER_IDENT')
+        self.mark = 0
+        self.proc = subprocess.Popen(
+            ['git', 'fast-import', '--date-format=raw', '--quiet'],
+            stdin=subprocess.PIPE,
+            bufsize=1 << 20,
+        )
+        self.queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+        self.writer.start()
+
+    def write_chunks(self):
+        """Переносит готовые куски потока из очереди в stdin fast-import"""
+        out = self.proc.stdin
+        broken = False
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if broken:
+                # fast-import уже завершился: очередь дочитывается, чтобы не блокировать генерацию
+                continue
+            try:
+                out.write(chunk)
+            except OSError:
+                broken = True
+        try:
+            out.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def add_data(chunk, data):
+        chunk.append(b'data %d\n' % len(data))
+        chunk.append(data)
+        chunk.append(b'\n')
+
+    def commit(self, date, message, file_paths):
+        """Добавляет в поток коммит с указанной датой и текущим содержимым файлов"""
+        chunk = []
+        marks = []
+        for file_path in file_paths:
+            self.mark += 1
+            chunk.append(b'blob\nmark :%d\n' % self.mark)
+            self.add_data(chunk, FILE_CONTENTS[file_path].encode('utf-8'))
+            marks.append((self.mark, file_path))
+        
+        when = format_date(date)
+        header = f'commit {self.branch}\nauthor {self.author} {when}\ncommitter {self.committer} {when}\n'
+        chunk.append(header.encode('utf-8'))
+        self.add_data(chunk, f'{message}\n'.encode('utf-8'))
+        if self.parent:
+            chunk.append(f'from {self.parent}\n'.encode('utf-8'))
+            self.parent = None
+        for mark, file_path in marks:
+            chunk.append(f'M 100644 :{mark} {file_path.replace(os.sep, "/")}\n'.encode('utf-8'))
+        chunk.append(b'\n')
+        self.queue.put(b''.join(chunk))
+
+    def close(self):
+        """Дожидается записи потока и завершения fast-import; ветка обновляется только при успехе"""
+        self.queue.put(None)
+        self.writer.join()
+        if self.proc.wait() != 0:
+            raise RuntimeError('git fast-import завершился с ошибкой, коммиты не созданы')
+
+
+def make_commit(stream, date, message, file_paths):
+    """Создает коммит с указанной датой"""
+    stream.commit(date, message, file_paths)
+    print(f"✓ {date.strftime('%Y-%m-%d %H:%M')}: {message}")
 
 
 def get_weekday_skip_days_for_week(week_start_date):
@@ -230,9 +343,65 @@ def get_weekday_skip_days_for_week(week_start_date):
     return skip_days
 
 
+def build_schedule():
+    """Заранее рассчитывает расписание на весь период: [(день, [время коммита, ...]), ...].
+    Пустой список времени означает пропущенный день.
+
+    Случайные величины тянутся пачками через random.choices (по одному вызову на
+    пропуски выходных, число коммитов и часы/минуты/секунды всех коммитов),
+    а не отдельными randint/random на каждый день и коммит."""
+    days = [START_DATE + timedelta(days=i) for i in range((END_DATE - START_DATE).days + 1)]
+    
+    # Рабочие дни для пропуска: 1-2 на каждую неделю (с понедельника первой недели)
+    skipped = set()
+    week_start = START_DATE - timedelta(days=START_DATE.weekday())
+    while week_start <= END_DATE:
+        skipped.update(get_weekday_skip_days_for_week(week_start))
+        week_start += timedelta(days=7)
+    
+    # Выходные (суббота=5, воскресенье=6) иногда пропускаем
+    weekends = [day for day in days if day.weekday() >= 5]
+    weekend_skips = random.choices((True, False), weights=(WEEKEND_SKIP_CHANCE, 1 - WEEKEND_SKIP_CHANCE), k=len(weekends))
+    skipped.update(day for day, skip in zip(weekends, weekend_skips) if skip)
+    
+    # Количество коммитов: выходные — больше, рабочие дни — меньше
+    active_weekends = [day for day in days if day.weekday() >= 5 and day not in skipped]
+    active_weekdays = [day for day in days if day.weekday() < 5 and day not in skipped]
+    counts = dict(zip(
+        active_weekends,
+        random.choices(range(WEEKEND_COMMITS_MIN, WEEKEND_COMMITS_MAX + 1), k=len(active_weekends)),
+    ))
+    counts.update(zip(
+        active_weekdays,
+        random.choices(range(WEEKDAY_COMMITS_MIN, WEEKDAY_COMMITS_MAX + 1), k=len(active_weekdays)),
+    ))
+    
+    # Случайное время в течение дня
+    # Выходные: более широкий диапазон (8:00-23:00)
+    # Рабочие дни: стандартный диапазон (9:00-20:00)
+    weekend_total = sum(counts[day] for day in active_weekends)
+    weekday_total = sum(counts[day] for day in active_weekdays)
+    hours = {
+        True: iter(random.choices(range(8, 24), k=weekend_total)),
+        False: iter(random.choices(range(9, 21), k=weekday_total)),
+    }
+    minutes = iter(random.choices(range(60), k=weekend_total + weekday_total))
+    seconds = iter(random.choices(range(60), k=weekend_total + weekday_total))
+    
+    schedule = []
+    for day in days:
+        day_hours = hours[day.weekday() >= 5]
+        commit_times = [
+            day.replace(hour=next(day_hours), minute=next(minutes), second=next(seconds))
+            for _ in range(counts.get(day, 0))
+        ]
+        schedule.append((day, commit_times))
+    
+    return schedule
+
+
 def generate_commits():
     """Генерирует коммиты на весь период"""
-    current_date = START_DATE
     total_commits = 0
     skipped_days = 0
     
@@ -246,78 +415,53 @@ def generate_commits():
     ]
     
     for file_path, file_type in base_files:
-        create_or_modify_file(file_path, file_type)
+        create_or_modify_file(file_path, file_type, START_DATE)
         FILES_TO_MANAGE.append(file_path)
     
+    # Расписание и сообщения считаются одним проходом до начала записи коммитов
+    schedule = build_schedule()
+    messages = iter(random.choices(COMMIT_MESSAGES, k=sum(len(times) for _, times in schedule)))
+    
+    stream = CommitStream()
+    
     # Первый коммит
-    make_commit(START_DATE, "Initial commit")
+    make_commit(stream, START_DATE, "Initial commit", [path for path, _ in base_files])
     total_commits += 1
     
     print(f"\nГенерация коммитов с {START_DATE.date()} по {END_DATE.date()}...")
     print("Логика: выходные - больше коммитов (3-5), рабочие дни - меньше (1-3), иногда пропуски")
     print("-" * 60)
     
-    # Находим начало первой недели (понедельник)
-    week_start = START_DATE
-    while week_start.weekday() != 0:  # 0 = понедельник
-        week_start -= timedelta(days=1)
-    
-    # Инициализируем пропущенные дни для первой недели
-    weekday_skip_days = get_weekday_skip_days_for_week(week_start)
-    
     # Генерируем коммиты для каждого дня
-    while current_date <= END_DATE:
-        # Если началась новая неделя, определяем дни для пропуска
-        if current_date.weekday() == 0:  # Понедельник
-            week_start = current_date
-            weekday_skip_days = get_weekday_skip_days_for_week(week_start)
-        
-        # Проверяем, нужно ли пропустить день
-        if should_skip_day(current_date, weekday_skip_days):
+    for current_date, commit_times in schedule:
+        if not commit_times:
             skipped_days += 1
             weekday_name = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'][current_date.weekday()]
             print(f"⊘ {current_date.strftime('%Y-%m-%d')} ({weekday_name}): пропущен")
-        else:
-            # Определяем количество коммитов для дня
-            weekday = current_date.weekday()
-            num_commits = get_commits_for_day(weekday)
-            
-            # Генерируем коммиты в течение дня
-            for i in range(num_commits):
-                # Случайное время в течение дня
-                # Выходные: более широкий диапазон (8:00-23:00)
-                # Рабочие дни: стандартный диапазон (9:00-20:00)
-                if weekday >= 5:  # Выходные
-                    hour = random.randint(8, 23)
-                else:  # Рабочие дни
-                    hour = random.randint(9, 20)
-                
-                minute = random.randint(0, 59)
-                commit_time = current_date.replace(hour=hour, minute=minute, second=random.randint(0, 59))
-                
-                # Выбираем файл для изменения
-                file_path = get_random_file()
-                if file_path:
-                    file_type = 'text'
-                    for ft, info in FILE_TYPES.items():
-                        if file_path.endswith(info['ext']):
-                            file_type = ft
-                            break
-                    create_or_modify_file(file_path, file_type)
-                
-                # Выбираем сообщение коммита
-                message = random.choice(COMMIT_MESSAGES)
-                
-                # Создаем коммит
-                make_commit(commit_time, message)
-                total_commits += 1
         
-        # Переходим к следующему дню
-        current_date += timedelta(days=1)
+        for commit_time in commit_times:
+            # Выбираем файл для изменения
+            file_paths = []
+            file_path = get_random_file()
+            if file_path:
+                file_type = EXT_TO_TYPE.get(os.path.splitext(file_path)[1], 'text')
+                create_or_modify_file(file_path, file_type, commit_time)
+                file_paths.append(file_path)
+            
+            # Создаем коммит
+            make_commit(stream, commit_time, next(messages), file_paths)
+            total_commits += 1
         
         # Прогресс каждые 30 дней
-        if (current_date - START_DATE).days % 30 == 0:
-            print(f"\nПрогресс: {(current_date - START_DATE).days} дней обработано, {total_commits} коммитов создано, {skipped_days} дней пропущено")
+        days_done = (current_date - START_DATE).days + 1
+        if days_done % 30 == 0:
+            print(f"\nПрогресс: {days_done} дней обработано, {total_commits} коммитов создано, {skipped_days} дней пропущено", flush=True)
+    
+    stream.close()
+    
+    # Рабочая копия и индекс приводятся к последнему коммиту
+    write_files()
+    update_index(FILE_CONTENTS)
     
     print("-" * 60)
     print(f"\n✓ Готово! Создано {total_commits} коммитов")
@@ -326,12 +470,15 @@ def generate_commits():
 
 
 if __name__ == '__main__':
+    # Строка на каждый коммит не должна быть отдельным write() в терминал:
+    # вывод буферизуется и сбрасывается на строках прогресса и при выходе
+    sys.stdout.reconfigure(line_buffering=False)
     try:
         generate_commits()
     except KeyboardInterrupt:
         print("\n\nПрервано пользователем")
     except Exception as e:
-        print(f"\nОшибка: {e}")
+        print(f"\nОшибка: {e}", flush=True)
         import traceback
         traceback.print_exc()
 
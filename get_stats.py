@@ -6,52 +6,47 @@
 
 import subprocess
 import json
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import date
+from collections import Counter
 import os
 
+try:
+    import orjson  # Необязательно: быстрая сериализация JSON на C
+except ImportError:
+    orjson = None
+
 def get_commit_stats():
     """Получает статистику коммитов из Git"""
-    # Получаем все коммиты с датами
-    result = subprocess.run(
-        ['git', 'log', '--format=%ai', '--date=short'],
-        capture_output=True,
+    # Получаем даты всех коммитов (%as — дата автора в формате YYYY-MM-DD)
+    # и считаем их по мере чтения, не собирая весь вывод git log в память
+    proc = subprocess.Popen(
+        ['git', 'log', '--format=%as'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
         text=True,
-        check=False
+        bufsize=1 << 20
     )
     
-    if result.returncode != 0:
+    # Подсчитываем коммиты по дням: Counter считает строки целиком на уровне C,
+    # перевод строки отрезается уже у уникальных дат
+    line_counts = Counter(proc.stdout)
+    
+    if proc.wait() != 0:
         print("Ошибка: Git репозиторий не найден или нет коммитов")
         return {}
     
-    # Подсчитываем коммиты по дням
-    commits_by_date = defaultdict(int)
-    
-    for line in result.stdout.strip().split('\n'):
-        if line:
-            # Парсим дату (формат: 2025-01-01 12:34:56 +0700)
-            date_str = line.split()[0]
-            try:
-                date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                commits_by_date[str(date)] += 1
-            except ValueError:
-                continue
+    commits_by_date = Counter({line.rstrip('\n'): count for line, count in line_counts.items() if line.strip()})
     
-    # Находим диапазон дат
+    # Находим диапазон дат (ISO-даты корректно сравниваются как строки)
     if not commits_by_date:
         return {}
     
-    dates = sorted(commits_by_date.keys())
-    start_date = datetime.strptime(dates[0], '%Y-%m-%d').date()
-    end_date = datetime.strptime(dates[-1], '%Y-%m-%d').date()
+    start_date = date.fromisoformat(min(commits_by_date))
+    end_date = date.fromisoformat(max(commits_by_date))
     
     # Создаем полный список дат с количеством коммитов
-    stats = {}
-    current = start_date
-    while current <= end_date:
-        date_str = str(current)
-        stats[date_str] = commits_by_date.get(date_str, 0)
-        current += timedelta(days=1)
+    days = [date.fromordinal(o).isoformat() for o in range(start_date.toordinal(), end_date.toordinal() + 1)]
+    stats = {day: commits_by_date.get(day, 0) for day in days}
     
     # Вычисляем общую статистику
     total_commits = sum(commits_by_date.values())
@@ -68,7 +63,14 @@ def get_commit_stats():
     }
 
 
-def generate_html_with_data(stats):
+def dump_stats_json(stats):
+    """Сериализует статистику в JSON (UTF-8 байты, отступ 2 пробела)"""
+    if orjson is not None:
+        return orjson.dumps(stats, option=orjson.OPT_INDENT_2)
+    return json.dumps(stats, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def generate_html_with_data(stats_json):
     """Генерирует HTML файл с встроенными данными"""
     # Читаем шаблон HTML
     template_path = 'stats.html'
@@ -76,12 +78,10 @@ def generate_html_with_data(stats):
         print(f"❌ Файл {template_path} не найден")
         return False
     
-    with open(template_path, 'r', encoding='utf-8') as f:
+    # Шаблон обрабатывается как байты: без декодирования и повторного кодирования документа
+    with open(template_path, 'rb') as f:
         html_content = f.read()
     
-    # Встраиваем данные в JavaScript
-    stats_json = json.dumps(stats, ensure_ascii=False)
-    
     # Заменяем функцию loadStats на встроенные данные
     old_load_function = """        // Загружаем данные
         async function loadStats() {
@@ -99,23 +99,28 @@ def generate_html_with_data(stats):
             }
         }"""
     
-    new_load_function = f"""        // Загружаем встроенные данные
-        function loadStats() {{
-            try {{
-                statsData = {stats_json};
+    # Встраиваем данные в JavaScript: уже сериализованный JSON вставляется как есть
+    new_load_function = b''.join([
+        """        // Загружаем встроенные данные
+        function loadStats() {
+            try {
+                statsData = """.encode('utf-8'),
+        stats_json,
+        b""";
                 renderStats();
-            }} catch (error) {{
+            } catch (error) {
                 document.getElementById('loading').style.display = 'none';
                 document.getElementById('error').style.display = 'block';
                 document.getElementById('error').textContent = error.message;
-            }}
-        }}"""
+            }
+        }""",
+    ])
     
-    html_content = html_content.replace(old_load_function, new_load_function)
+    html_content = html_content.replace(old_load_function.encode('utf-8'), new_load_function)
     
     # Сохраняем обновленный HTML
     output_path = 'stats.html'
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with open(output_path, 'wb') as f:
         f.write(html_content)
     
     return True
@@ -125,12 +130,15 @@ if __name__ == '__main__':
     stats = get_commit_stats()
     
     if stats:
+        # JSON сериализуется один раз и используется и для файла, и для HTML
+        stats_json = dump_stats_json(stats)
+        
         # Сохраняем в JSON файл (для совместимости)
-        with open('stats.json', 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False)
+        with open('stats.json', 'wb') as f:
+            f.write(stats_json)
         
         # Генерируем HTML с встроенными данными
-        if generate_html_with_data(stats):
+        if generate_html_with_data(stats_json):
             print(f"✓ Статистика встроена в stats.html")
         else:
             print(f"⚠️  Не удалось обновить stats.html, но stats.json создан")
@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 """
 Интерактивный переписыватель истории: проходит по всем коммитам и позволяет
-изменить их текст. Работает через `git filter-branch` и переписывает историю
-ветки, поэтому используйте только если готовы к force-push.
+изменить их текст. Работает через `git fast-export | git fast-import` и переписывает
+историю ветки, поэтому используйте только если готовы к force-push.
 
 Как работает:
-1. Собирает список коммитов (от самых старых к новым) через `git rev-list --reverse HEAD`.
+1. Собирает коммиты (от самых старых к новым) через `git rev-list --reverse HEAD`, а их
+   текст читает одним процессом `git cat-file --batch`.
 2. По каждому коммиту показывает хэш и текущий текст; предлагает ввести новый.
    - Пустой ввод оставит сообщение без изменений.
-3. После подтверждения запускает `git filter-branch --msg-filter ...`, передавая
-   таблицу соответствий commit->new_message через переменную окружения.
+3. После подтверждения сохраняет вершину ветки в refs/original/, выгружает ветку через
+   `git fast-export --no-data --show-original-ids`, подменяет сообщения прямо в потоке
+   (по `original-oid` коммита) и загружает результат обратно `git fast-import --force --done`.
+   Если поток оборвался, ветка не меняется. Теги на переписанных коммитах переносятся на новые.
 
 Требования:
 - Чистое рабочее дерево (без незакоммиченных изменений).
@@ -18,11 +21,9 @@
 
 from __future__ import annotations
 
-import json
-import os
 import subprocess
 import sys
-from typing import Dict, List, Sequence
+from typing import BinaryIO, Dict, List, Sequence, Tuple
 
 
 def run_git(args: Sequence[str], check: bool = True) -> subprocess.CompletedProcess[str]:
@@ -35,29 +36,50 @@ def run_git(args: Sequence[str], check: bool = True) -> subprocess.CompletedProc
 
 
 def ensure_clean_worktree() -> None:
-    dirty = run_git(["status", "--short"]).stdout.strip()
-    if dirty:
+    # diff-index сообщает о незакоммиченных изменениях кодом возврата, без обхода
+    # неотслеживаемых файлов и разбора вывода; refresh обновляет stat-данные индекса,
+    # чтобы файлы, которых просто коснулись, не считались измененными.
+    run_git(["update-index", "-q", "--refresh"], check=False)
+    if run_git(["diff-index", "--quiet", "HEAD", "--"], check=False).returncode != 0:
         sys.exit("Рабочее дерево грязное. Очистите или закоммитьте изменения перед переписыванием истории.")
 
 
-def list_commits() -> List[str]:
-    result = run_git(["rev-list", "--reverse", "HEAD"])
-    commits = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+def read_commit_messages(commits: Sequence[str]) -> List[str]:
+    # Один процесс `git cat-file --batch` на все коммиты. Каждый объект вычитывается ровно
+    # по размеру из заголовка `<sha> commit <size>`, поэтому никакие байты в тексте
+    # сообщений не ломают разбор (в отличие от разделителей в выводе git log).
+    result = subprocess.run(
+        ["git", "cat-file", "--batch", "--buffer"],
+        input="".join(f"{commit}\n" for commit in commits).encode("ascii"),
+        capture_output=True,
+        check=True,
+    )
+    out = result.stdout
+    messages: List[str] = []
+    pos = 0
+    for _ in commits:
+        header_end = out.index(b"\n", pos)
+        size = int(out[pos:header_end].rsplit(b" ", 1)[1])
+        start = header_end + 1
+        raw = out[start:start + size]
+        pos = start + size + 1  # за содержимым объекта идет LF
+        # Заголовки коммита отделены от сообщения пустой строкой
+        messages.append(raw.partition(b"\n\n")[2].decode("utf-8", errors="replace").strip())
+    return messages
+
+
+def load_commits_with_messages() -> List[Tuple[str, str]]:
+    result = run_git(["rev-list", "--reverse", "HEAD"], check=False)
+    commits = result.stdout.split()
     if not commits:
         sys.exit("Коммитов не найдено.")
-    return commits
+    return list(zip(commits, read_commit_messages(commits)))
 
 
-def read_commit_message(commit: str) -> str:
-    result = run_git(["log", "-1", "--format=%B", commit])
-    return result.stdout.strip()
-
-
-def collect_new_messages(commits: List[str]) -> Dict[str, str]:
+def collect_new_messages(commits: List[Tuple[str, str]]) -> Dict[str, str]:
     mapping: Dict[str, str] = {}
     print("Введите новый текст для каждого коммита. Пусто — оставить как есть.\n")
-    for commit in commits:
-        old_msg = read_commit_message(commit)
+    for commit, old_msg in commits:
         print("=" * 60)
         print(f"{commit}")
         print(f"Текущий текст:\n{old_msg}")
@@ -78,31 +100,128 @@ def confirm(mapping: Dict[str, str]) -> None:
         sys.exit("Отменено пользователем.")
 
 
+def get_current_branch() -> str:
+    result = run_git(["symbolic-ref", "-q", "HEAD"], check=False)
+    if result.returncode != 0:
+        sys.exit("HEAD не указывает на ветку (detached HEAD). Переключитесь на ветку и повторите.")
+    return result.stdout.strip()
+
+
+def filter_export_stream(source: BinaryIO, sink: BinaryIO, mapping: Dict[str, str]) -> None:
+    # В потоке fast-export у каждого коммита есть строка `original-oid <sha>`, а сообщение
+    # идет блоком `data <N>` из ровно N байт; блок заменяется, если для sha есть новый текст.
+    original = None
+    in_commit = False
+    for line in source:
+        if line.startswith(b"data "):
+            data = source.read(int(line[5:]))
+            new_msg = mapping.get(original) if in_commit and original else None
+            if new_msg is not None:
+                data = (new_msg + "\n").encode("utf-8")
+            sink.write(b"data %d\n" % len(data))
+            sink.write(data)
+            original = None
+            continue
+        if line.startswith(b"commit "):
+            in_commit = True
+            original = None
+        elif line.startswith((b"tag ", b"reset ")):
+            in_commit = False
+        elif line.startswith(b"original-oid "):
+            original = line[len(b"original-oid "):].strip().decode("ascii")
+        sink.write(line)
+
+
+def find_tags_to_move(old_tip: str, mapping: Dict[str, str]) -> List[str]:
+    # Переписываются коммиты из mapping и все их потомки. Теги на них нужно перенести
+    # на новые коммиты (как делал filter-branch с --tag-name-filter cat); теги на
+    # нетронутых коммитах в поток не попадают и остаются как есть.
+    changed = set(mapping)
+    result = run_git(["rev-list", "--reverse", "--topo-order", "--parents", old_tip])
+    for line in result.stdout.splitlines():
+        commit, *parents = line.split()
+        if any(parent in changed for parent in parents):
+            changed.add(commit)
+
+    tags = run_git(
+        ["for-each-ref", "--merged", old_tip, "--format=%(refname) %(objectname) %(*objectname)", "refs/tags"]
+    ).stdout
+    to_move: List[str] = []
+    for line in tags.splitlines():
+        refname, objectname, *peeled = line.split()
+        # У аннотированного тега %(*objectname) — коммит, на который он указывает
+        if (peeled[0] if peeled else objectname) in changed:
+            to_move.append(refname)
+    return to_move
+
+
+def discard_pipeline(export: subprocess.Popen, fast_import: subprocess.Popen) -> None:
+    # fast-import убивается, а не получает EOF: иначе он обновил бы ссылки тем, что
+    # успел принять, и обрезал бы ветку. С --done неполный поток и так считается ошибкой.
+    for proc in (export, fast_import):
+        if proc.poll() is None:
+            proc.kill()
+    for stream in (export.stdout, fast_import.stdin):
+        try:
+            stream.close()
+        except OSError:
+            pass
+    export.wait()
+    fast_import.wait()
+
+
 def rewrite_history(mapping: Dict[str, str]) -> None:
-    env = os.environ.copy()
-    env["MESSAGE_MAP"] = json.dumps(mapping)
-
-    msg_filter = r"""python3 - <<'PY' "$GIT_COMMIT"
-import json, os, sys
-mapping = json.loads(os.environ["MESSAGE_MAP"])
-commit = sys.argv[1]
-old_msg = sys.stdin.read()
-sys.stdout.write(mapping.get(commit, old_msg))
-PY"""
-
-    # Используем --tag-name-filter cat, чтобы не ломать теги; -- --all можно добавить при необходимости.
-    cmd = ["git", "filter-branch", "-f", "--msg-filter", msg_filter, "--tag-name-filter", "cat", "--", "HEAD"]
-    print("\nЗапускаю filter-branch... (это может занять время)")
+    branch = get_current_branch()
+    old_tip = run_git(["rev-parse", branch]).stdout.strip()
+    tags = find_tags_to_move(old_tip, mapping)
+
+    # Как и filter-branch, сохраняем прежнюю вершину ветки в refs/original/ — заранее,
+    # чтобы она была доступна, что бы ни случилось дальше.
+    run_git(["update-ref", "-m", "rewrite_commit_messages: backup", f"refs/original/{branch}", old_tip])
+
+    # Сообщения подменяются прямо в потоке `git fast-export | git fast-import`:
+    # ни одного процесса на коммит, содержимое файлов не выгружается (--no-data).
+    # --use-done-feature/--done: fast-import применит ссылки, только дочитав поток до конца;
+    # --reencode=yes: коммиты с заголовком encoding не обрывают выгрузку.
+    print("\nПереписываю историю через fast-export/fast-import...")
+    export = subprocess.Popen(
+        [
+            "git", "fast-export", "--no-data", "--show-original-ids", "--signed-tags=strip",
+            "--use-done-feature", "--reencode=yes", branch, *tags,
+        ],
+        stdout=subprocess.PIPE,
+        bufsize=64 * 1024,
+    )
+    fast_import = subprocess.Popen(
+        ["git", "fast-import", "--done", "--force", "--quiet"],
+        stdin=subprocess.PIPE,
+        bufsize=64 * 1024,
+    )
+    streamed = False
     try:
-        subprocess.run(cmd, text=True, check=True, env=env)
-    except subprocess.CalledProcessError as exc:
-        sys.exit(f"filter-branch завершился с ошибкой: {exc}")
+        filter_export_stream(export.stdout, fast_import.stdin, mapping)
+        export.stdout.close()
+        if export.wait() != 0:
+            sys.exit("fast-export завершился с ошибкой, история не изменена.")
+        fast_import.stdin.close()
+        streamed = True
+    except BrokenPipeError:
+        sys.exit("fast-import завершился с ошибкой, история не изменена.")
+    finally:
+        if not streamed:
+            discard_pipeline(export, fast_import)
+    if fast_import.wait() != 0:
+        sys.exit("fast-import завершился с ошибкой, история не изменена.")
+
     print("\nГотово. История переписана. Не забудьте сделать force-push при необходимости.")
+    print(f"Старая вершина ветки сохранена в refs/original/{branch}.")
+    if tags:
+        print(f"Перенесены теги: {', '.join(tag[len('refs/tags/'):] for tag in tags)}")
 
 
 def main() -> None:
     ensure_clean_worktree()
-    commits = list_commits()
+    commits = load_commits_with_messages()
     mapping = collect_new_messages(commits)
     confirm(mapping)
     rewrite_history(mapping)